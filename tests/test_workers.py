@@ -0,0 +1,234 @@
+import errno
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import MERGE_FORMATS
+from workers import MERGE_READ_CHUNK_BYTES, MERGE_SCAN_STAT_BATCH, MergerWorker, SplitterWorker
+
+
+class RecordedSignal:
+    ''' Stands in for a bound pyqtSignal and keeps every emit. '''
+
+    def __init__(self):
+        self.calls = []
+
+    def emit(self, *args):
+        self.calls.append(args)
+
+
+class RecordingSignals:
+    ''' Replaces a worker's WorkerSignals so tests can read what it reported. '''
+
+    def __init__(self):
+        for name in ("progress", "log", "finished", "error", "text_ready"):
+            setattr(self, name, RecordedSignal())
+
+
+class StopOnSubmitPool(ThreadPoolExecutor):
+    ''' Stops the worker as each task is queued, so every task starts after the stop. '''
+
+    def __init__(self, worker):
+        super().__init__(max_workers=2)
+        self.worker = worker
+
+    def submit(self, fn, *args, **kwargs):
+        self.worker.stop()
+        return super().submit(fn, *args, **kwargs)
+
+
+class StopOnSubmitMerger(MergerWorker):
+    def _get_io_pool(self):
+        if self._io_pool is None:
+            self._io_pool = StopOnSubmitPool(self)
+        return self._io_pool
+
+
+class SplitterWorkerTests(unittest.TestCase):
+    ''' Runs SplitterWorker.run() synchronously against small merged files. '''
+
+    def setUp(self):
+        self.base_dir = tempfile.mkdtemp()
+        self.output_dir = os.path.join(self.base_dir, "out")
+        os.makedirs(self.output_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.base_dir)
+
+    def _split(self, merged_bytes, format_key="Default"):
+        merged_path = os.path.join(self.base_dir, "merged.txt")
+        with open(merged_path, "wb") as merged_file:
+            merged_file.write(merged_bytes)
+        SplitterWorker(merged_path, self.output_dir, MERGE_FORMATS[format_key]).run()
+
+    def _read_output(self, name):
+        with open(os.path.join(self.output_dir, name), "rb") as output_file:
+            return output_file.read()
+
+    def test_non_utf8_delimiter_path_does_not_swallow_next_block(self):
+        self._split(b"--- START FILE: caf\xe9.txt ---\none\n--- END FILE: caf\xe9.txt ---\n\n"
+                    b"--- START FILE: b.txt ---\ntwo\n--- END FILE: b.txt ---\n")
+        self.assertEqual(self._read_output("caf�.txt"), b"one\n")
+        self.assertEqual(self._read_output("b.txt"), b"two\n")
+
+    def test_unexpected_error_in_one_block_keeps_the_rest_of_the_batch(self):
+        reaped_paths = []
+
+        class FailingSplitter(SplitterWorker):
+            def _write_file(self, relative_path_str, content_bytes):
+                if relative_path_str == "f4.txt":
+                    raise RuntimeError("injected")
+                return super()._write_file(relative_path_str, content_bytes)
+
+            def _reap_writes(self, wait_all=False):
+                written = super()._reap_writes(wait_all)
+                reaped_paths.extend(written)
+                return written
+
+        merged_path = os.path.join(self.base_dir, "merged.txt")
+        with open(merged_path, "wb") as merged_file:
+            for i in range(10):
+                merged_file.write(b"--- START FILE: f%d.txt ---\n%d\n--- END FILE: f%d.txt ---\n\n" % (i, i, i))
+        FailingSplitter(merged_path, self.output_dir, MERGE_FORMATS["Default"]).run()
+        expected = ["f%d.txt" % i for i in range(10) if i != 4]
+        self.assertEqual(sorted(os.listdir(self.output_dir)), expected)
+        self.assertEqual(sorted(os.path.basename(path) for path in reaped_paths), expected)
+
+
+class MergerWorkerTests(unittest.TestCase):
+    ''' Runs MergerWorker.run() synchronously against a small source tree. '''
+
+    def setUp(self):
+        self.base_dir = tempfile.mkdtemp()
+        self.source_dir = os.path.join(self.base_dir, "src")
+        self.project_dir = os.path.join(self.source_dir, "proj")
+        os.makedirs(self.project_dir)
+        self.output_file = os.path.join(self.base_dir, "merged.txt")
+
+    def tearDown(self):
+        shutil.rmtree(self.base_dir)
+
+    def _write_source(self, name, data):
+        path = os.path.join(self.project_dir, name)
+        with open(path, "wb") as source_file:
+            source_file.write(data)
+        return path
+
+    def _merge(self, items, worker_class=MergerWorker):
+        worker = worker_class(items, MERGE_FORMATS["Default"], output_file=self.output_file)
+        worker.run()
+        with open(self.output_file, "rb") as merged_file:
+            return merged_file.read()
+
+    def _merged_paths(self, merged_bytes):
+        prefix = b"--- START FILE: "
+        return [line[len(prefix):-len(b" ---")].decode("utf-8")
+                for line in merged_bytes.splitlines() if line.startswith(prefix)]
+
+    def test_file_symlink_collapses_onto_its_target(self):
+        target = self._write_source("a.txt", b"a\n")
+        try:
+            os.symlink("a.txt", os.path.join(self.project_dir, "link_a.txt"))
+        except (OSError, NotImplementedError) as e:
+            self.skipTest(f"symlinks unavailable: {e}")
+        merged = self._merge([("folder", self.project_dir, self.source_dir),
+                              ("file", target, self.source_dir)])
+        self.assertEqual(self._merged_paths(merged), ["proj/a.txt"])
+
+    def test_hard_links_keep_the_first_relative_path(self):
+        self._write_source("b.txt", b"same\n")
+        try:
+            os.link(os.path.join(self.project_dir, "b.txt"),
+                    os.path.join(self.project_dir, "a.txt"))
+        except (OSError, AttributeError) as e:
+            self.skipTest(f"hard links unavailable: {e}")
+        merged = self._merge([("folder", self.project_dir, self.source_dir)])
+        self.assertEqual(self._merged_paths(merged), ["proj/a.txt"])
+
+    def _run_recorded(self, worker_class, items):
+        worker = worker_class(items, MERGE_FORMATS["Default"], output_file=self.output_file)
+        worker.signals = RecordingSignals()
+        worker.run()
+        return worker.signals
+
+    def _assert_clean_cancel(self, signals, message):
+        self.assertEqual(signals.finished.calls, [(False, message)])
+        logged = "\n".join(call[0] for call in signals.log.calls)
+        self.assertNotIn("Error", logged)
+        self.assertFalse(os.path.exists(self.output_file))
+
+    def test_stop_before_read_ahead_batch_starts_cancels_cleanly(self):
+        for i in range(3):
+            self._write_source(f"f{i}.txt", b"x\n")
+        signals = self._run_recorded(
+            StopOnSubmitMerger, [("folder", self.project_dir, self.source_dir)])
+        self._assert_clean_cancel(signals, "Merge cancelled.")
+
+    def test_stop_before_stat_batch_starts_cancels_cleanly(self):
+        # More than one stat batch, so the scan stats on the pool
+        for i in range(MERGE_SCAN_STAT_BATCH + 1):
+            self._write_source(f"f{i}.txt", b"x\n")
+        signals = self._run_recorded(
+            StopOnSubmitMerger, [("folder", self.project_dir, self.source_dir)])
+        self._assert_clean_cancel(signals, "Merge cancelled during scan.")
+
+    def _write_large_sources(self):
+        # Only UTF-8 files past one read chunk go through os.sendfile
+        self._write_source("a.txt", b"a\n")
+        self._write_source("big.txt", b"big line\n" * (MERGE_READ_CHUNK_BYTES // 8))
+        self._write_source("c.txt", b"c\n")
+        return [("folder", self.project_dir, self.source_dir)]
+
+    @unittest.skipUnless(hasattr(os, "sendfile"), "os.sendfile unavailable")
+    def test_sendfile_unsupported_falls_back_to_identical_output(self):
+        items = self._write_large_sources()
+        expected = self._merge(items)
+        unsupported = OSError(errno.ENOTSOCK, "Socket operation on non-socket")
+        with mock.patch("workers.os.sendfile", side_effect=unsupported) as sendfile:
+            merged = self._merge(items)
+        self.assertTrue(sendfile.called)
+        self.assertEqual(merged, expected)
+
+    @unittest.skipUnless(hasattr(os, "sendfile"), "os.sendfile unavailable")
+    def test_sendfile_failing_part_way_truncates_the_partial_copy(self):
+        items = self._write_large_sources()
+        real_sendfile = os.sendfile
+
+        def send_once_then_fail(out_fd, in_fd, offset, count):
+            if offset:
+                raise OSError(errno.EIO, "Input/output error")
+            return real_sendfile(out_fd, in_fd, offset, 4096)
+
+        with mock.patch("workers.os.sendfile", side_effect=send_once_then_fail):
+            merged = self._merge(items)
+        self.assertNotIn(b"big line", merged)
+        self.assertIn(b"--- START FILE: proj/big.txt ---\nError reading file: ", merged)
+        self.assertIn(b"--- START FILE: proj/c.txt ---\nc\n", merged)
+
+
+class HierarchyTreeTests(unittest.TestCase):
+    ''' Checks the tree drawn by MergerWorker._generate_hierarchy_tree_string. '''
+
+    def _tree_lines(self, relative_paths):
+        worker = MergerWorker([], MERGE_FORMATS["Default"])
+        tree = worker._generate_hierarchy_tree_string(
+            [("", relative_path, 0) for relative_path in relative_paths])
+        return tree.splitlines()[1:-1]
+
+    def test_file_and_folder_with_same_name(self):
+        self.assertEqual(self._tree_lines(["a/c", "a/c/c"]), [
+            "└── a/",
+            "    ├── c/",
+            "    │   └── c",
+            "    └── c",
+        ])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,9 +1,21 @@
 import os
 import re
+import errno
+import functools
+import codecs
+import mmap
+import stat
+import time
 import pathlib
+import threading
+import itertools
+import operator
 import traceback
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait as wait_futures
+from contextlib import contextmanager
 from PyQt6.QtCore import QObject, pyqtSignal
-from io import StringIO
+from io import BytesIO
 
 # --- Worker Signals ---
 
@@ -21,11 +33,151 @@ class WorkerSignals(QObject):
 # --- Hierarchy Tree Delimiters (Used by both workers) ---
 TREE_START_DELIMITER = "--- START FILE HIERARCHY ---"
 TREE_END_DELIMITER = "--- END FILE HIERARCHY ---"
+# Byte forms let the splitter match raw lines without decoding them
+TREE_START_DELIMITER_BYTES = TREE_START_DELIMITER.encode("ascii")
+TREE_END_DELIMITER_BYTES = TREE_END_DELIMITER.encode("ascii")
+
+# --- Progress Reporting ---
+# Minimum number of bytes processed between progress updates in hot loops
+PROGRESS_BYTES_STEP = 256 * 1024
+# Minimum delay (seconds) between two progress signals crossing to the UI thread
+PROGRESS_MIN_INTERVAL = 0.05
+# Files merged between two samples of the output position for progress
+MERGE_PROGRESS_FILE_STEP = 64
+# Number of buffered log messages that triggers a flush to the UI
+LOG_FLUSH_COUNT = 100
+
+# --- Merge I/O ---
+# Bytes read from an input file per chunk while merging
+MERGE_READ_CHUNK_BYTES = 1024 * 1024
+# Input files smaller than this skip the read buffer and are read in a single call
+MERGE_SMALL_FILE_BYTES = 64 * 1024
+# Buffer size of the merged output file
+MERGE_WRITE_BUFFER_BYTES = 1024 * 1024
+# Result a pool batch returns per item once a stop was requested; consumers test it with
+# "is" and treat it as a cancel rather than as a (result, error) pair
+MERGE_BATCH_SKIPPED = (None, None)
+# Threads stat'ing scanned files and reading small inputs ahead in parallel;
+# helps most on network filesystems
+try:
+    MERGE_SCAN_THREADS = max(1, int(os.environ.get("MERGER_SCAN_THREADS", "8")))
+except ValueError:
+    MERGE_SCAN_THREADS = 8
+# Inputs read ahead of the one being written, and per pool task; only files below
+# MERGE_SMALL_FILE_BYTES are read ahead
+MERGE_PREFETCH_FILES = 64
+MERGE_PREFETCH_BATCH = 16
+# Scanned entries stat'ed per pool task, keeping per-task overhead small
+MERGE_SCAN_STAT_BATCH = 256
+# Sibling directories listed per pool task during the folder walk
+MERGE_SCAN_DIR_BATCH = 8
+# sendfile() errors meaning the platform cannot copy file-to-file in the kernel
+SENDFILE_UNSUPPORTED_ERRNOS = {errno.EINVAL, errno.ENOSYS, errno.ENOTSOCK,
+                               getattr(errno, "EOPNOTSUPP", errno.EINVAL)}
+
+# --- Split Start-Line Prefilter ---
+# Characters that end the literal head of a start_regex_pattern; the first four
+# make the character before them optional or repeated, so it is dropped as well
+REGEX_QUANTIFIER_CHARS = "*+?{"
+REGEX_META_CHARS = REGEX_QUANTIFIER_CHARS + ".^$}[]\\|()"
+
+# --- Split Path Safety ---
+# Matches absolute paths (leading slash or drive letter) and any '..' segment
+UNSAFE_PATH_RE = re.compile(r'^(?:[A-Za-z]:|[\\/])|(?:^|[\\/])\.\.(?:[\\/]|$)')
+
+# --- Split Parser States ---
+SPLIT_STATE_SKIPPING_TREE = "skipping-tree"  # Inside the optional hierarchy header
+SPLIT_STATE_SCANNING = "scanning"            # Looking for a start delimiter
+SPLIT_STATE_IN_BLOCK = "in-block"            # Collecting content until the end delimiter
+
+# --- Split Output Writing ---
+# O_BINARY keeps Windows from translating newlines on raw os.write calls
+OUTPUT_OPEN_FLAGS = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(
+    os, "O_BINARY", 0)
+# Refuses to open an output through a symlink (0 where unsupported, e.g. Windows) and
+# the errno values it fails with (ELOOP on Linux and macOS, EMLINK on FreeBSD)
+OUTPUT_NOFOLLOW_FLAG = getattr(os, "O_NOFOLLOW", 0)
+SYMLINK_REFUSED_ERRNOS = {errno.ELOOP, errno.EMLINK}
+# Outputs are opened relative to a descriptor of the output directory where supported
+OUTPUT_DIR_FD_SUPPORTED = os.open in os.supports_dir_fd and hasattr(os, "O_DIRECTORY")
+# O_PATH (Linux) opens the directory without needing read permission on it; a write+search-only
+# output directory can still anchor relative opens
+OUTPUT_DIR_FD_FLAGS = os.O_RDONLY | getattr(os, "O_DIRECTORY", 0) | getattr(os, "O_PATH", 0)
+# Outputs at least this large get their space reserved in one allocation before writing.
+# Python only exposes posix_fallocate, which glibc emulates by writing zeros over the whole
+# range on filesystems without native support (e.g. NFSv3, ext3, many FUSE mounts); that
+# doubles the I/O for the file. Each output is written in one call, so delayed allocation
+# already keeps typical outputs contiguous; only very large ones are worth the risk
+FALLOCATE_MIN_BYTES = 64 * 1024 * 1024
+# Outputs at least this large are dropped from the page cache after writing
+FADVISE_MIN_BYTES = 8 * 1024 * 1024
+# Background threads writing split outputs while parsing continues; writes are
+# I/O bound, so this scales past the CPU count
+SPLIT_WRITE_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+# Queued write tasks before parsing waits for the oldest
+MAX_PENDING_WRITES = 64
+# Blocks grouped into one write task, and the content size that submits a group early
+SPLIT_WRITE_BATCH_BLOCKS = 64
+SPLIT_WRITE_BATCH_BYTES = 1024 * 1024
+# Encoded end delimiters kept per run; bounded so huge merges don't keep one per file
+END_DELIMITER_CACHE_SIZE = 1024
+
+# --- Base Worker ---
+
+
+class BaseWorker(QObject):
+    ''' Shared stop flag, logging and throttled progress reporting for the workers. '''
+
+    def __init__(self):
+        super().__init__()
+        # Set by stop(), possibly from another thread; hot loops poll its is_set() directly
+        self._stop_event = threading.Event()
+        self._last_emit_ts = 0.0
+        self._last_pct = -1
+        self._log_buf = []
+        self._log_lock = threading.Lock()  # Background write threads may log too
+
+    @property
+    def is_running(self):
+        return not self._stop_event.is_set()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def log(self, msg):
+        self._flush_log()  # Keep buffered messages in order
+        self.signals.log.emit(msg)
+
+    def _queue_log(self, msg):
+        """Buffers a log message from a hot loop; flushed in batches."""
+        with self._log_lock:
+            self._log_buf.append(msg)
+            if len(self._log_buf) < LOG_FLUSH_COUNT:
+                return
+        self._flush_log()
+
+    def _flush_log(self):
+        if not self._log_buf:
+            return  # Usual case in hot loops; a message appended meanwhile waits for the next flush
+        with self._log_lock:
+            buffered, self._log_buf = self._log_buf, []
+        if buffered:
+            self.signals.log.emit("\n".join(buffered))
+
+    def _emit_progress(self, percent):
+        """Emits progress only when the percentage changed and not too often."""
+        if percent == self._last_pct:
+            return  # Most calls; skip the clock read entirely
+        now = time.monotonic()
+        if now - self._last_emit_ts > PROGRESS_MIN_INTERVAL:
+            self.signals.progress.emit(percent)
+            self._last_emit_ts = now
+            self._last_pct = percent
 
 # --- Merger Worker ---
 
 
-class MergerWorker(QObject):
+class MergerWorker(BaseWorker):
     ''' Performs the file merging in a separate thread using a specified format. '''
     signals = WorkerSignals()
 
@@ -35,14 +187,12 @@ class MergerWorker(QObject):
         self.output_file = output_file
         self.merge_format_details = merge_format_details
         self.include_tree = include_tree
-        self.is_running = True
-
-    def stop(self):
-        print("MergerWorker: Stop signal received.")
-        self.is_running = False
-
-    def log(self, msg):
-        self.signals.log.emit(msg)
+        # Set in run(): large UTF-8 inputs are copied by the kernel when writing to a file
+        self._kernel_copy = False
+        # Stats scanned folder entries during discovery, then reads small inputs ahead
+        self._io_pool = None
+        # Directory path -> realpath, reset per run; selections share a few bases and folders
+        self._resolved_dirs = {}
 
     # --- Helper to generate the tree structure string ---
     def _generate_hierarchy_tree_string(self, files_to_process):
@@ -54,88 +204,316 @@ class MergerWorker(QObject):
         L_BRANCH = "└── "
         INDENT_CONT = "│   "
         INDENT_EMPTY = "    "
-        tree_dict = {}
-
-        # --- Helper to build the nested dictionary structure ---
-        def add_path_to_dict(node, path_parts):
-            current_level = node
-            for i, part in enumerate(path_parts):
-                is_last_part = (i == len(path_parts) - 1)
-                if is_last_part:
-                    if "_files" not in current_level:
-                        current_level["_files"] = []
-                    if part not in current_level["_files"]:
-                        current_level["_files"].append(part)
-                else:
-                    if part not in current_level:
-                        current_level[part] = {}
-                    current_level = current_level[part]
 
-        # --- Populate the dictionary ---
+        # --- Collect unique paths with a sort key per component ---
+        # Directories sort before files, both case-insensitively; ties keep the order in which
+        # entries were first seen. A single-part path is shown as a root directory.
         root_name = None
         processed_relative_paths = set()
+        dir_first_seen = {}  # Directory parts tuple -> order of first appearance
+        entries = []
         for _, relative_path, _ in files_to_process:
-            rel_path_obj = pathlib.Path(relative_path)
-            rel_path_str_posix = rel_path_obj.as_posix()
-
-            if rel_path_str_posix in processed_relative_paths:
+            if relative_path in processed_relative_paths:
                 continue
-            processed_relative_paths.add(rel_path_str_posix)
+            processed_relative_paths.add(relative_path)
 
-            path_parts = list(rel_path_obj.parts)
+            path_parts = tuple(
+                part for part in relative_path.split("/") if part and part != ".")
             if not path_parts:
                 continue
 
             if root_name is None:
                 root_name = path_parts[0]
-                if root_name not in tree_dict:
-                    tree_dict[root_name] = {}
-            if path_parts[0] == root_name:
-                add_path_to_dict(tree_dict[root_name], path_parts[1:])
-            else:
+            elif path_parts[0] != root_name:
                 self.log(
-                    f"Warning: Path '{rel_path_str_posix}' does not share common root '{root_name}'. Adding as separate root.")
-                root_name_alt = path_parts[0]
-                if root_name_alt not in tree_dict:
-                    tree_dict[root_name_alt] = {}
-                add_path_to_dict(tree_dict[root_name_alt], path_parts[1:])
-
-        # --- Helper to recursively format the tree string ---
+                    f"Warning: Path '{relative_path}' does not share common root '{root_name}'. Adding as separate root.")
+
+            dir_parts = path_parts[:-1] if len(path_parts) > 1 else path_parts
+            sort_key = []
+            for depth in range(len(dir_parts)):
+                order = dir_first_seen.setdefault(
+                    dir_parts[:depth + 1], len(dir_first_seen))
+                sort_key.append((0, dir_parts[depth].lower(), order))
+            if len(path_parts) > 1:
+                sort_key.append((1, path_parts[-1].lower(), len(entries)))
+            entries.append((sort_key, dir_parts, path_parts))
+
+        # One sort puts the entries in display order
+        entries.sort(key=operator.itemgetter(0))
+
+        # --- Find the last child of every directory with a reverse pass ---
+        # Children are (parts, is_dir), so a file and a folder sharing a name stay distinct
+        last_child = {}
+        for _, dir_parts, path_parts in reversed(entries):
+            if path_parts is not dir_parts:
+                last_child.setdefault(dir_parts, (path_parts, False))
+            for depth in range(len(dir_parts)):
+                last_child.setdefault(
+                    dir_parts[:depth], (dir_parts[:depth + 1], True))
+
+        # --- Walk the sorted paths, emitting directories the first time they appear ---
         output_lines = []
-
-        def format_node(name, node_content, indent, is_last_node):
-            prefix = L_BRANCH if is_last_node else T_BRANCH
-            output_lines.append(f"{indent}{prefix}{name}/")
-            child_indent = indent + \
-                (INDENT_EMPTY if is_last_node else INDENT_CONT)
-            dirs = sorted([k for k in node_content if k !=
-                          "_files"], key=str.lower)
-            files = sorted(node_content.get("_files", []), key=str.lower)
-            items = dirs + files
-            total_items = len(items)
-            for i, item_name in enumerate(items):
-                is_last_item = (i == total_items - 1)
-                if item_name in dirs:
-                    format_node(
-                        item_name, node_content[item_name], child_indent, is_last_item)
-                else:
-                    child_prefix = L_BRANCH if is_last_item else T_BRANCH
-                    output_lines.append(
-                        f"{child_indent}{child_prefix}{item_name}")
-
-        # --- Format the tree starting from the roots ---
-        root_keys = sorted(tree_dict.keys(), key=str.lower)
-        total_roots = len(root_keys)
-        for i, current_root_name in enumerate(root_keys):
-            is_last_root = (i == total_roots - 1)
-            format_node(current_root_name,
-                        tree_dict[current_root_name], "", is_last_root)
+        indents = [""]  # Indent for each depth along the current directory chain
+        prev_dir_parts = ()
+        for _, dir_parts, path_parts in entries:
+            common = 0
+            max_common = min(len(prev_dir_parts), len(dir_parts))
+            while common < max_common and prev_dir_parts[common] == dir_parts[common]:
+                common += 1
+            del indents[common + 1:]
+            for depth in range(common, len(dir_parts)):
+                is_last = last_child[dir_parts[:depth]] == (dir_parts[:depth + 1], True)
+                prefix = L_BRANCH if is_last else T_BRANCH
+                output_lines.append(
+                    f"{indents[depth]}{prefix}{dir_parts[depth]}/")
+                indents.append(
+                    indents[depth] + (INDENT_EMPTY if is_last else INDENT_CONT))
+            if path_parts is not dir_parts:
+                prefix = L_BRANCH if last_child[dir_parts] == (path_parts, False) else T_BRANCH
+                output_lines.append(
+                    f"{indents[len(dir_parts)]}{prefix}{path_parts[-1]}")
+            prev_dir_parts = dir_parts
 
         # --- Combine with delimiters ---
         final_string = TREE_START_DELIMITER + "\n" + \
             "\n".join(output_lines) + "\n" + TREE_END_DELIMITER + "\n"
         return final_string
 
+    def _get_io_pool(self):
+        """Returns the pool shared by the scan and the read-ahead, starting it on first use."""
+        if self._io_pool is None:
+            self._io_pool = ThreadPoolExecutor(
+                max_workers=MERGE_SCAN_THREADS, thread_name_prefix="merge-io")
+        return self._io_pool
+
+    def _read_small_file(self, file_path):
+        """Reads a whole input through an unbuffered file object; used for files below
+           MERGE_SMALL_FILE_BYTES."""
+        with open(file_path, "rb", buffering=0) as infile:
+            # readall() reads to EOF, so a file that grew since the scan is still complete
+            return infile.readall()
+
+    def _read_small_files(self, file_paths):
+        """Reads a batch of small inputs on the read-ahead pool.
+           Returns a (content, None) or (None, OSError) pair per path, in order,
+           or MERGE_BATCH_SKIPPED for each path if the merge was stopped."""
+        if not self.is_running:
+            return [MERGE_BATCH_SKIPPED] * len(file_paths)
+        results = []
+        for file_path in file_paths:
+            try:
+                results.append((self._read_small_file(file_path), None))
+            except OSError as e_read:
+                results.append((None, e_read))
+        return results
+
+    def _write_whole_content(self, outfile, content, source_encoding):
+        """Writes a fully read input as UTF-8. Decoding happens before anything is written.
+           Returns the last byte written."""
+        if source_encoding == "utf-8":
+            # ASCII is valid UTF-8; isascii() checks it without building a str
+            if not content.isascii():
+                content.decode("utf-8")  # Validates; raises UnicodeDecodeError
+            data = content
+        else:
+            data = content.decode(source_encoding).encode("utf-8")
+        outfile.write(data)
+        return data[-1:]
+
+    def _copy_file_content(self, outfile, file_path, source_encoding="utf-8", size_hint=None, prefetched=None):
+        """Copies file_path into the binary outfile as UTF-8, reading MERGE_READ_CHUNK_BYTES at a time.
+           UTF-8 input is validated and copied unchanged; any other source_encoding is transcoded.
+           size_hint is the size seen during discovery; files below MERGE_SMALL_FILE_BYTES are
+           read whole, and prefetched may already hold that (content, error) from the read-ahead.
+           If reading fails part-way, the partial output is rolled back before the error propagates.
+           Returns the last byte written, or b'' for an empty file."""
+        if prefetched is not None:
+            content, e_read = prefetched
+            if e_read is not None:
+                raise e_read
+            return self._write_whole_content(outfile, content, source_encoding)
+        if size_hint is not None and size_hint < MERGE_SMALL_FILE_BYTES:
+            return self._write_whole_content(outfile, self._read_small_file(file_path), source_encoding)
+        passthrough = source_encoding == "utf-8"
+        with open(file_path, "rb") as infile:
+            if passthrough and self._kernel_copy:
+                file_size = os.fstat(infile.fileno()).st_size
+                if file_size > MERGE_READ_CHUNK_BYTES:
+                    return self._send_utf8_file(outfile, infile, file_size)
+            chunk = infile.read(MERGE_READ_CHUNK_BYTES)
+            if len(chunk) < MERGE_READ_CHUNK_BYTES:
+                return self._write_whole_content(outfile, chunk, source_encoding)
+            # A later chunk may still fail to decode; remember where this content began
+            content_start = outfile.tell()
+            decoder = codecs.getincrementaldecoder(source_encoding)()
+            last_byte = b""
+            try:
+                while chunk:
+                    if passthrough and chunk.isascii() and not decoder.getstate()[0]:
+                        data = chunk  # ASCII after a complete sequence; nothing to validate
+                    else:
+                        text = decoder.decode(chunk)
+                        data = chunk if passthrough else text.encode("utf-8")
+                    outfile.write(data)
+                    last_byte = data[-1:] or last_byte
+                    chunk = infile.read(MERGE_READ_CHUNK_BYTES)
+                # Rejects a multi-byte sequence cut off by the end of the file
+                decoder.decode(b"", final=True)
+            except Exception:
+                outfile.seek(content_start)
+                outfile.truncate()
+                raise
+            return last_byte
+
+    def _send_utf8_file(self, outfile, infile, file_size):
+        """Validates infile as UTF-8 through a read-only mapping, then copies it into outfile
+           with os.sendfile so the content never passes through Python buffers.
+           Raises UnicodeDecodeError before anything is written. Returns the last byte copied."""
+        with mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            view = memoryview(mapped)
+            try:
+                pos = 0
+                while pos < file_size:
+                    chunk_end = pos + MERGE_READ_CHUNK_BYTES
+                    # Decoding the mapped slice validates it without copying it into bytes
+                    _, consumed = codecs.utf_8_decode(
+                        view[pos:chunk_end], "strict", chunk_end >= file_size)
+                    pos += consumed
+                last_byte = mapped[file_size - 1:file_size]
+            finally:
+                view.release()
+
+        outfile.flush()
+        content_start = outfile.tell()
+        out_fd = outfile.fileno()
+        in_fd = infile.fileno()
+        offset = 0
+        try:
+            while offset < file_size:
+                try:
+                    sent = os.sendfile(out_fd, in_fd, offset, file_size - offset)
+                except OSError as e_send:
+                    if offset or e_send.errno not in SENDFILE_UNSUPPORTED_ERRNOS:
+                        raise
+                    # No file-to-file sendfile here (e.g. macOS); copy through user space
+                    infile.seek(0)
+                    chunk = infile.read(MERGE_READ_CHUNK_BYTES)
+                    while chunk:
+                        outfile.write(chunk)
+                        chunk = infile.read(MERGE_READ_CHUNK_BYTES)
+                    return last_byte
+                if sent == 0:
+                    break  # The file shrank after it was validated
+                offset += sent
+        except Exception:
+            outfile.seek(content_start)
+            outfile.truncate()
+            raise
+        return last_byte
+
+    def _is_filepath_only_format(self, fmt):
+        """True if fmt has no replacement field other than {filepath}, so
+           fmt.replace("{filepath}", path) gives the same result as fmt.format(filepath=path)."""
+        rest = fmt.replace("{filepath}", "")
+        return "{" not in rest and "}" not in rest
+
+    def _resolve_dir(self, dir_path_str):
+        """os.path.realpath() for a directory, cached for the rest of the run."""
+        resolved = self._resolved_dirs.get(dir_path_str)
+        if resolved is None:
+            resolved = os.path.realpath(dir_path_str)
+            self._resolved_dirs[dir_path_str] = resolved
+        return resolved
+
+    def _resolve_path(self, path_str):
+        """Equivalent of os.path.realpath() that resolves only the parent directory, through
+           the cache, plus one lstat of the final component when it is not itself a link."""
+        if os.pardir in path_str or not os.path.isabs(path_str):
+            return os.path.realpath(path_str)  # '..' must apply after links are resolved
+        path_str = os.path.normpath(path_str)
+        parent_str, name = os.path.split(path_str)
+        if not name or os.path.islink(path_str):
+            return os.path.realpath(path_str)
+        return os.path.join(self._resolve_dir(parent_str), name)
+
+    def _file_identity(self, file_stat, file_path):
+        """Returns the deduplication key for a discovered file: (st_dev, st_ino), or the
+           normalized path when it could not be stat'ed or the filesystem reports no inode number."""
+        if file_stat is not None and file_stat.st_ino:
+            return (file_stat.st_dev, file_stat.st_ino)
+        # abspath collapses spellings like 'a/./b'; normcase folds case where the OS ignores it
+        return os.path.normcase(os.path.abspath(file_path))
+
+    def _stat_entries(self, entries):
+        """Stats a batch of scanned DirEntry objects on a scan thread.
+           Returns a (stat_result, None) or (None, OSError) pair per entry, in order,
+           or MERGE_BATCH_SKIPPED for each entry if the merge was stopped."""
+        if not self.is_running:
+            return [MERGE_BATCH_SKIPPED] * len(entries)
+        results = []
+        for entry in entries:
+            try:
+                entry_stat = entry.stat()
+                if not entry_stat.st_ino:
+                    # Windows DirEntry.stat() leaves st_ino/st_dev zeroed
+                    entry_stat = os.stat(entry.path)
+                results.append((entry_stat, None))
+            except OSError as e_stat:
+                results.append((None, e_stat))
+        return results
+
+    def _scan_dir(self, dir_path_str):
+        """Lists one directory for _iter_folder_files; runs on the I/O pool for subdirectories.
+           Returns (non-directory entries, subdirectory paths, OSError or None)."""
+        file_entries = []
+        subdirs = []
+        if not self.is_running:
+            return file_entries, subdirs, None
+        try:
+            with os.scandir(dir_path_str) as entries:
+                for entry in entries:
+                    try:
+                        # d_type from the directory read; no stat() on most platforms
+                        is_dir = entry.is_dir()
+                    except OSError:
+                        is_dir = False
+                    if not is_dir:
+                        file_entries.append(entry)
+                    elif not entry.is_symlink():
+                        subdirs.append(entry.path)
+        except OSError as e:
+            return file_entries, subdirs, e
+        return file_entries, subdirs, None
+
+    def _scan_dirs(self, dir_paths):
+        """Lists a batch of sibling directories on the I/O pool; one _scan_dir result per path."""
+        return [self._scan_dir(dir_path_str) for dir_path_str in dir_paths]
+
+    def _iter_folder_files(self, folder_path_str):
+        """Yields a DirEntry for every non-directory entry below folder_path_str.
+           Like os.walk(followlinks=False), links to directories are skipped rather than entered.
+           Subdirectories are listed on the I/O pool, MERGE_SCAN_DIR_BATCH per task, as soon as
+           they are found; entries are still yielded in the depth-first order of a sequential walk."""
+        # (path, future of its batch's listings, index in the batch); no future for the root
+        pending_dirs = [(folder_path_str, None, 0)]
+        while pending_dirs and self.is_running:
+            dir_path_str, listing, batch_index = pending_dirs.pop()
+            if listing is None:
+                file_entries, subdirs, e = self._scan_dir(dir_path_str)
+            else:
+                file_entries, subdirs, e = listing.result()[batch_index]
+            yield from file_entries
+            if subdirs:
+                io_pool = self._get_io_pool()
+                for i in range(0, len(subdirs), MERGE_SCAN_DIR_BATCH):
+                    batch = subdirs[i:i + MERGE_SCAN_DIR_BATCH]
+                    listing = io_pool.submit(self._scan_dirs, batch)
+                    pending_dirs.extend(
+                        (subdir, listing, j) for j, subdir in enumerate(batch))
+            if e is not None:
+                self.log(
+                    f"Warning: Could not scan folder '{dir_path_str}': {e}")
+
     def run(self):
         if self.output_file:
             self.log(
@@ -149,29 +527,41 @@ class MergerWorker(QObject):
 
         files_to_process = []
         total_size = 0
-        processed_size = 0
-        processed_files_count = 0
-        encountered_resolved_paths = set()
+        self._resolved_dirs = {}
         output_file_path = None
 
         start_fmt = self.merge_format_details.get("start", "{filepath}")
         end_fmt = self.merge_format_details.get("end", "")
-        separator = self.merge_format_details.get("file_separator", "\n")
-        content_prefix = self.merge_format_details.get("content_prefix", "")
-        content_suffix = self.merge_format_details.get("content_suffix", "")
+        # Formats whose only field is {filepath} are filled with str.replace, skipping the
+        # str.format parser; anything else (escaped braces, other fields) still uses format
+        start_simple = self._is_filepath_only_format(start_fmt)
+        end_simple = self._is_filepath_only_format(end_fmt)
+        # Output is written as UTF-8 bytes; encode the fixed parts of the format once
+        separator_b = self.merge_format_details.get(
+            "file_separator", "\n").encode("utf-8", errors="replace")
+        content_prefix_b = self.merge_format_details.get(
+            "content_prefix", "").encode("utf-8", errors="replace")
+        content_suffix_b = self.merge_format_details.get(
+            "content_suffix", "").encode("utf-8", errors="replace")
 
         try:
             # --- Phase 1: Discover all files ---
             self.log("Scanning files and folders based on input selections...")
             initial_item_count = len(self.items_to_merge)
+            stop_requested = self._stop_event.is_set
+            # (absolute path, relative path, size, identity key); duplicates are dropped after sorting
             files_discovered_in_scan = []
             for item_idx, (item_type, item_path_str, base_path_str) in enumerate(self.items_to_merge):
                 if not self.is_running:
                     break
                 try:
-                    item_path = pathlib.Path(item_path_str).resolve()
-                    base_path = pathlib.Path(base_path_str).resolve(
-                    ) if base_path_str else item_path.parent.resolve()
+                    # Discovery works on plain path strings; Path objects per file add up
+                    item_path = self._resolve_path(item_path_str)
+                    if base_path_str:
+                        base_path = self._resolve_dir(base_path_str)
+                    else:
+                        # item_path is already resolved, so its parent is too
+                        base_path = os.path.dirname(item_path)
                 except OSError as e:
                     self.log(
                         f"Warning: Could not resolve path '{item_path_str}' or base '{base_path_str}': {e}. Skipping item.")
@@ -181,130 +571,91 @@ class MergerWorker(QObject):
                         f"Warning: Error processing path '{item_path_str}': {e}. Skipping item.")
                     continue
 
+                # Both paths are resolved, so relative paths are found by stripping a
+                # prefix; normcase covers case-insensitive systems
+                base_prefix = os.path.join(base_path, "")
+                base_prefix_norm = os.path.normcase(base_prefix)
+
                 if item_type == "file":
-                    if item_path.is_file():
-                        if item_path not in encountered_resolved_paths:
-                            try:
-                                relative_path = item_path.relative_to(
-                                    base_path)
-                                fsize = item_path.stat().st_size
-                                files_discovered_in_scan.append(
-                                    (item_path, relative_path, fsize))
-                                total_size += fsize
-                                encountered_resolved_paths.add(item_path)
-                            except ValueError:
-                                try:
-                                    relative_path = item_path.relative_to(
-                                        item_path.parent)
-                                    self.log(
-                                        f"Warning: Could not make '{item_path}' relative to base '{base_path}'. Using path relative to parent: '{relative_path}'.")
-                                except ValueError:
-                                    relative_path = pathlib.Path(
-                                        item_path.name)
-                                    self.log(
-                                        f"Warning: Could not determine relative path for '{item_path}' against base '{base_path}'. Using filename only: '{relative_path}'.")
-                                try:
-                                    fsize = item_path.stat().st_size
-                                    files_discovered_in_scan.append(
-                                        (item_path, relative_path, fsize))
-                                    total_size += fsize
-                                    encountered_resolved_paths.add(item_path)
-                                except OSError as e_size:
-                                    self.log(
-                                        f"Warning: Could not get size for {item_path}: {e_size}. Using size 0.")
-                                    files_discovered_in_scan.append(
-                                        (item_path, relative_path, 0))
-                                    encountered_resolved_paths.add(item_path)
-                            except OSError as e_stat:
-                                self.log(
-                                    f"Warning: Could not get size for {item_path}: {e_stat}. Using size 0.")
-                                try:
-                                    relative_path_fallback = item_path.relative_to(
-                                        base_path)
-                                except ValueError:
-                                    relative_path_fallback = pathlib.Path(
-                                        item_path.name)
-                                files_discovered_in_scan.append(
-                                    (item_path, relative_path_fallback, 0))
-                                encountered_resolved_paths.add(item_path)
-                            except Exception as e_other:
-                                self.log(
-                                    f"Warning: Unexpected error processing file entry {item_path}: {e_other}")
+                    try:
+                        # One stat gives the type, the size and the identity used for deduplication
+                        item_stat = os.stat(item_path)
+                    except OSError:
+                        item_stat = None
+                    if item_stat is not None and stat.S_ISREG(item_stat.st_mode):
+                        if item_path.startswith(base_prefix) or \
+                                os.path.normcase(item_path).startswith(base_prefix_norm):
+                            relative_path = item_path[len(base_prefix):]
+                            if os.sep != "/":
+                                relative_path = relative_path.replace(
+                                    os.sep, "/")
+                        else:
+                            relative_path = os.path.basename(item_path)
+                            self.log(
+                                f"Warning: Could not make '{item_path}' relative to base '{base_path}'. Using path relative to parent: '{relative_path}'.")
+                        files_discovered_in_scan.append(
+                            (item_path, relative_path, item_stat.st_size,
+                             self._file_identity(item_stat, item_path)))
                     else:
                         self.log(
                             f"Warning: Selected file not found during scan: {item_path}")
                 elif item_type == "folder" or item_type == "folder-root":
-                    if item_path.is_dir():
-                        for root, _, filenames in os.walk(str(item_path), followlinks=False):
-                            if not self.is_running:
+                    if os.path.isdir(item_path):
+                        # Entry paths extend the resolved folder path
+                        item_prefix = os.path.join(item_path, "")
+                        # The directory walk stays sequential; the per-file stats run on the pool
+                        folder_entries = list(
+                            self._iter_folder_files(item_path))
+                        stat_batches = [folder_entries[i:i + MERGE_SCAN_STAT_BATCH]
+                                        for i in range(0, len(folder_entries), MERGE_SCAN_STAT_BATCH)]
+                        if len(stat_batches) > 1:
+                            batch_results = self._get_io_pool().map(
+                                self._stat_entries, stat_batches)
+                        else:
+                            batch_results = map(
+                                self._stat_entries, stat_batches)
+                        entry_results = zip(
+                            folder_entries, itertools.chain.from_iterable(batch_results))
+                        for entry, stat_result in entry_results:
+                            if stop_requested() or stat_result is MERGE_BATCH_SKIPPED:
                                 break
-                            root_path = pathlib.Path(root)
-                            for filename in filenames:
-                                if not self.is_running:
-                                    break
-                                try:
-                                    file_path = (
-                                        root_path / filename).resolve()
-                                    if file_path not in encountered_resolved_paths:
-                                        try:
-                                            relative_path = file_path.relative_to(
-                                                base_path)
-                                            fsize = file_path.stat().st_size
-                                            files_discovered_in_scan.append(
-                                                (file_path, relative_path, fsize))
-                                            total_size += fsize
-                                            encountered_resolved_paths.add(
-                                                file_path)
-                                        except ValueError:
-                                            try:
-                                                relative_path_fallback = file_path.relative_to(
-                                                    item_path)
-                                                self.log(
-                                                    f"Warning: Could not make '{file_path}' relative to original base '{base_path}'. Using path relative to scanned folder '{item_path}': '{relative_path_fallback}'.")
-                                            except ValueError:
-                                                relative_path_fallback = pathlib.Path(
-                                                    file_path.name)
-                                                self.log(
-                                                    f"Error: Could not even make '{file_path}' relative to its walk root '{item_path}'. Using filename only: '{relative_path_fallback}'.")
-                                            try:
-                                                fsize = file_path.stat().st_size
-                                                files_discovered_in_scan.append(
-                                                    (file_path, relative_path_fallback, fsize))
-                                                total_size += fsize
-                                                encountered_resolved_paths.add(
-                                                    file_path)
-                                            except OSError as e_size:
-                                                self.log(
-                                                    f"Warning: Could not get size for {file_path}: {e_size}. Using size 0.")
-                                                files_discovered_in_scan.append(
-                                                    (file_path, relative_path_fallback, 0))
-                                                encountered_resolved_paths.add(
-                                                    file_path)
-                                        except OSError as e_stat:
-                                            self.log(
-                                                f"Warning: Could not get size for {file_path}: {e_stat}. Using size 0.")
-                                            try:
-                                                rel_p = file_path.relative_to(
-                                                    base_path)
-                                            except ValueError:
-                                                try:
-                                                    rel_p = file_path.relative_to(
-                                                        item_path)
-                                                except ValueError:
-                                                    rel_p = pathlib.Path(
-                                                        file_path.name)
-                                            files_discovered_in_scan.append(
-                                                (file_path, rel_p, 0))
-                                            encountered_resolved_paths.add(
-                                                file_path)
-                                except OSError as e_resolve:
+                            entry_stat, e_stat = stat_result
+                            try:
+                                # The scan starts from a resolved folder and does not follow
+                                # directory links; only a file symlink is resolved, so it is
+                                # listed under its target's path like any other alias of it
+                                file_path = entry.path
+                                if entry.is_symlink():
+                                    file_path = os.path.realpath(file_path)
+                                if e_stat is not None:
                                     self.log(
-                                        f"Warning: Could not resolve or access path under {root_path} for filename '{filename}': {e_resolve}")
-                                except Exception as e:
+                                        f"Warning: Could not get size for {file_path}: {e_stat}. Using size 0.")
+                                elif not stat.S_ISREG(entry_stat.st_mode):
+                                    # FIFOs, sockets and devices: reading one could block the merge
                                     self.log(
-                                        f"Warning: Could not process file '{filename}' in folder scan under {root_path}: {e}")
-                            if not self.is_running:
-                                break
+                                        f"Warning: Skipping '{file_path}': not a regular file.")
+                                    continue
+                                if file_path.startswith(base_prefix) or \
+                                        os.path.normcase(file_path).startswith(base_prefix_norm):
+                                    relative_path = file_path[len(base_prefix):]
+                                elif file_path.startswith(item_prefix):
+                                    relative_path = file_path[len(item_prefix):]
+                                    self.log(
+                                        f"Warning: Could not make '{file_path}' relative to original base '{base_path}'. Using path relative to scanned folder '{item_path}': '{relative_path}'.")
+                                else:
+                                    relative_path = os.path.basename(file_path)
+                                    self.log(
+                                        f"Error: Could not even make '{file_path}' relative to its walk root '{item_path}'. Using filename only: '{relative_path}'.")
+                                if os.sep != "/":
+                                    relative_path = relative_path.replace(
+                                        os.sep, "/")
+                                fsize = entry_stat.st_size if entry_stat is not None else 0
+                                files_discovered_in_scan.append(
+                                    (file_path, relative_path, fsize,
+                                     self._file_identity(entry_stat, file_path)))
+                            except Exception as e:
+                                self.log(
+                                    f"Warning: Could not process file '{entry.name}' in folder scan under {os.path.dirname(entry.path)}: {e}")
                         if not self.is_running:
                             break
                     else:
@@ -317,8 +668,16 @@ class MergerWorker(QObject):
                     False, "Merge cancelled during scan.")
                 return
 
-            files_to_process = sorted(
-                files_discovered_in_scan, key=lambda x: x[1].as_posix())
+            # Deduplicating in relative-path order keeps the same name for a file with several
+            # paths (hard links, a link and its target) whatever order the scan met them in
+            encountered_files = set()
+            for file_path, relative_path, fsize, file_key in sorted(
+                    files_discovered_in_scan, key=operator.itemgetter(1)):
+                if file_key in encountered_files:
+                    continue
+                encountered_files.add(file_key)
+                files_to_process.append((file_path, relative_path, fsize))
+                total_size += fsize
 
             if not files_to_process:
                 self.log("No valid, unique files found to merge after scanning.")
@@ -344,9 +703,11 @@ class MergerWorker(QObject):
                         False, "Merge failed: Could not create output directory.")
                     return
                 outfile_context = open(
-                    output_file_path, "w", encoding="utf-8", errors='replace')
+                    output_file_path, "wb", buffering=MERGE_WRITE_BUFFER_BYTES)
+                self._kernel_copy = hasattr(os, "sendfile")
             else:
-                outfile_context = StringIO()
+                outfile_context = BytesIO()
+                self._kernel_copy = False
 
             result_text = None
 
@@ -357,83 +718,106 @@ class MergerWorker(QObject):
                     tree_content = self._generate_hierarchy_tree_string(
                         files_to_process)
                     if tree_content:
-                        outfile.write(tree_content)
+                        outfile.write(tree_content.encode(
+                            "utf-8", errors="replace"))
                         if files_to_process:
-                            outfile.write(separator)
+                            outfile.write(separator_b)
                     else:
                         self.log("No files processed, skipping tree writing.")
 
                 # --- Write file content blocks ---
                 total_files_count = len(files_to_process)
+                # Progress follows the bytes actually written; the expected output size adds
+                # each file's delimiters (path in start and end) to the content size
+                per_file_overhead = len(start_fmt) + len(end_fmt) + len(separator_b) + \
+                    len(content_prefix_b) + len(content_suffix_b) + 3
+                output_estimate = total_size + total_files_count * per_file_overhead + \
+                    2 * sum(len(rel_path) for _, rel_path, _ in files_to_process)
+                content_start = outfile.tell()
+                write = outfile.write
+                # Small inputs are read in batches on the pool ahead of the write cursor
+                read_ahead = deque()  # (file indexes, future) per batch, in file order
+                read_ready = {}       # File index -> (content, error) from a finished batch
+                next_read_ahead = 0 if total_files_count > 1 else total_files_count
                 for i, (absolute_path, relative_path, fsize) in enumerate(files_to_process):
-                    if not self.is_running:
+                    if stop_requested():
                         break
-
-                    relative_path_str = relative_path.as_posix()
-                    start_delimiter = start_fmt.format(
-                        filepath=relative_path_str)
-                    try:
-                        end_delimiter = end_fmt.format(
+                    while next_read_ahead < min(i + MERGE_PREFETCH_FILES, total_files_count):
+                        batch_end = min(next_read_ahead + MERGE_PREFETCH_BATCH, total_files_count)
+                        batch_indexes = [j for j in range(next_read_ahead, batch_end)
+                                         if files_to_process[j][2] < MERGE_SMALL_FILE_BYTES]
+                        if batch_indexes:
+                            read_ahead.append((batch_indexes, self._get_io_pool().submit(
+                                self._read_small_files, [files_to_process[j][0] for j in batch_indexes])))
+                        next_read_ahead = batch_end
+                    if read_ahead and read_ahead[0][0][0] == i:
+                        batch_indexes, batch_future = read_ahead.popleft()
+                        read_ready.update(zip(batch_indexes, batch_future.result()))
+                    prefetched = read_ready.pop(i, None)
+                    if prefetched is MERGE_BATCH_SKIPPED:
+                        break  # The batch saw the stop before reading; nothing to write
+
+                    relative_path_str = relative_path
+                    if start_simple:
+                        start_delimiter = start_fmt.replace("{filepath}", relative_path_str)
+                    else:
+                        start_delimiter = start_fmt.format(
                             filepath=relative_path_str)
-                    except KeyError:
-                        end_delimiter = end_fmt
+                    if end_simple:
+                        end_delimiter = end_fmt.replace("{filepath}", relative_path_str)
+                    else:
+                        try:
+                            end_delimiter = end_fmt.format(
+                                filepath=relative_path_str)
+                        except KeyError:
+                            end_delimiter = end_fmt
 
-                    outfile.write(start_delimiter + "\n")
-                    if content_prefix:
-                        outfile.write(content_prefix)
+                    # Fragments around the content go out as one write each side
+                    write((start_delimiter + "\n").encode(
+                        "utf-8", errors="replace") + content_prefix_b)
 
-                    file_content = ""
+                    last_byte = b""
                     try:
                         try:
-                            with open(absolute_path, "r", encoding='utf-8', errors='strict') as infile:
-                                file_content = infile.read()
+                            last_byte = self._copy_file_content(
+                                outfile, absolute_path, size_hint=fsize, prefetched=prefetched)
                         except UnicodeDecodeError:
+                            # latin-1 maps every byte, so this fallback cannot fail to decode
                             self.log(
                                 f"Warning: Non-UTF-8 file detected: '{relative_path_str}'. Attempting 'latin-1' decode.")
-                            try:
-                                with open(absolute_path, "r", encoding='latin-1') as infile:
-                                    file_content = infile.read()
-                            except Exception as e_latin:
-                                self.log(
-                                    f"Warning: Failed to decode '{relative_path_str}' as latin-1: {e_latin}. Using lossy UTF-8.")
-                                with open(absolute_path, 'r', encoding='utf-8', errors='replace') as infile:
-                                    file_content = infile.read()
+                            last_byte = self._copy_file_content(
+                                outfile, absolute_path, "latin-1", fsize, prefetched)
                         except Exception as e_read:
                             self.log(
                                 f"Error reading file '{absolute_path}': {e_read}. Inserting error message.")
-                            file_content = f"Error reading file: {e_read}"
-
-                        outfile.write(file_content)
-                        if file_content and not file_content.endswith('\n'):
-                            outfile.write("\n")
+                            error_b = f"Error reading file: {e_read}".encode(
+                                "utf-8", errors="replace")
+                            write(error_b)
+                            last_byte = error_b[-1:]
                     except Exception as e_outer:
                         self.log(
                             f"Critical error processing file content for {absolute_path}: {e_outer}\n{traceback.format_exc()}")
-                        outfile.write(
-                            f"\nError processing file content: {e_outer}\n")
-
-                    if content_suffix:
-                        outfile.write(content_suffix)
-                    outfile.write(end_delimiter + "\n")
+                        write(
+                            f"\nError processing file content: {e_outer}\n".encode("utf-8", errors="replace"))
+                        last_byte = b"\n"
 
-                    if i < total_files_count - 1:
-                        outfile.write(separator)
+                    # Content must end with a newline; a missing one is added in the trailer write
+                    write((b"\n" if last_byte and last_byte != b"\n" else b"") + content_suffix_b +
+                          (end_delimiter + "\n").encode("utf-8", errors="replace") +
+                          (separator_b if i < total_files_count - 1 else b""))
 
                     # --- Progress Update ---
-                    processed_size += fsize
-                    processed_files_count += 1
-                    if total_size > 0:
-                        progress_percent = int(
-                            (processed_size / total_size) * 100)
-                    elif total_files_count > 0:
-                        progress_percent = int(
-                            (processed_files_count / total_files_count) * 100)
-                    else:
-                        progress_percent = 0
-                    self.signals.progress.emit(min(progress_percent, 100))
+                    # Sampled every MERGE_PROGRESS_FILE_STEP files, and after any large file
+                    if i % MERGE_PROGRESS_FILE_STEP == 0 or fsize >= PROGRESS_BYTES_STEP:
+                        self._emit_progress(min(
+                            (outfile.tell() - content_start) * 100 // output_estimate, 100))
+
+                for _, pending_read in read_ahead:
+                    pending_read.cancel()  # Left over after a cancel
 
                 if self.is_running and not self.output_file:
-                    result_text = outfile.getvalue()
+                    result_text = outfile.getvalue().decode(
+                        "utf-8", errors="replace")
 
             # --- Final checks and signals ---
             if not self.is_running:
@@ -467,13 +851,16 @@ class MergerWorker(QObject):
             self.signals.finished.emit(
                 False, f"Merge failed due to unexpected error: {e}")
         finally:
+            if self._io_pool is not None:
+                self._io_pool.shutdown(wait=True)
+                self._io_pool = None
             if self.is_running:
                 self.signals.progress.emit(100)
 
 # --- Splitter Worker ---
 
 
-class SplitterWorker(QObject):
+class SplitterWorker(BaseWorker):
     ''' Performs the file splitting in a separate thread based on a specified format. '''
     signals = WorkerSignals()
 
@@ -482,14 +869,28 @@ class SplitterWorker(QObject):
         self.merged_file = merged_file
         self.output_dir = pathlib.Path(output_dir)
         self.format_details = split_format_details
-        self.is_running = True
-
-    def stop(self):
-        print("SplitterWorker: Stop signal received.")
-        self.is_running = False
-
-    def log(self, msg):
-        self.signals.log.emit(msg)
+        # Resolved once per run in run(), reused by every _write_file call. Not cached across
+        # runs: the directory (or a parent) may have been swapped for a symlink in between
+        self._output_dir_resolved_str = ""
+        self._output_dir_prefix = ""  # Resolved path plus trailing separator
+        self._output_dir_fd = None    # Anchor for relative opens, held open during run()
+        self._output_dir_prefix_norm = ""
+        # Blocks are written on a thread pool while parsing continues, in batches
+        self._write_pool = None
+        self._pending_writes = deque()  # (batch, target keys, future) per submitted task
+        self._pending_targets = {}      # Target key -> future of the task writing it
+        self._write_batch = []          # (relative path, start, end) not yet submitted
+        self._write_batch_keys = []
+        self._write_batch_bytes = 0
+        # Relative directory -> absolute parent path, already containment-checked and
+        # created this run; shared by the write threads, which lock only to insert
+        self._parent_dirs = {}
+        self._parent_dirs_lock = threading.Lock()
+        # Whole-line regexes for delimiters that find() kept hitting mid-line
+        self._delimiter_line_res = {}
+        # Incremental newline count behind _line_number_at
+        self._line_count_pos = 0
+        self._line_count = 0
 
     def run(self):
         self.log(f"Starting split process for: {self.merged_file}")
@@ -500,7 +901,10 @@ class SplitterWorker(QObject):
             # --- Format Specific Settings ---
             try:
                 start_regex_pattern = self.format_details["start_regex_pattern"]
-                start_regex = re.compile(start_regex_pattern)
+                # Matched against raw line bytes; only the captured path is decoded
+                start_regex = re.compile(start_regex_pattern.encode('utf-8'))
+                # Every start line begins with this literal; other lines skip the regex
+                start_prefix_b = self._literal_regex_prefix(start_regex_pattern)
                 get_end_delimiter_func = self.format_details["get_end_delimiter"]
                 skip_line_after_start = self.format_details.get(
                     "skip_line_after_start", False)
@@ -516,223 +920,193 @@ class SplitterWorker(QObject):
                 raise FileNotFoundError(
                     f"Input file not found: {self.merged_file}")
 
+            # --- Validate and resolve the output directory once ---
+            if not self.output_dir.is_dir() or not os.access(str(self.output_dir), os.W_OK):
+                error_msg = f"Output directory '{self.output_dir}' is not accessible or writable."
+                self.log(f"Error: {error_msg}")
+                self.signals.error.emit(error_msg)
+                self.signals.finished.emit(False, f"Split failed: {error_msg}")
+                return
+            self._output_dir_resolved_str = os.path.realpath(self.output_dir)
+            self._output_dir_prefix = os.path.join(
+                self._output_dir_resolved_str, "")
+            # Case-normalized form for the containment prefix test
+            self._output_dir_prefix_norm = os.path.normcase(
+                self._output_dir_prefix)
+            if OUTPUT_DIR_FD_SUPPORTED:
+                # Output opens then skip walking the output directory's own path each time
+                try:
+                    self._output_dir_fd = os.open(
+                        self._output_dir_resolved_str, OUTPUT_DIR_FD_FLAGS)
+                except OSError:
+                    # e.g. no read permission without O_PATH; _write_bytes opens by absolute path
+                    self._output_dir_fd = None
+
             total_size = merged_file_path.stat().st_size
-            processed_size = 0
             file_count = 0
+            # Absolute paths as returned by _write_file; the set removes a path's repeat blocks
             created_file_paths = set()
-            tree_skipped_bytes = 0
-
-            with open(merged_file_path, "rb") as infile_b:
-                # --- Skip Hierarchy Tree Section (if present) ---
+            self._write_pool = None  # Started by the first batch that needs it
+            self._pending_writes = deque()
+            self._pending_targets = {}
+            self._write_batch = []
+            self._write_batch_keys = []
+            self._write_batch_bytes = 0
+            # The output directory itself was resolved and checked above; never mkdir it
+            self._parent_dirs = {"": self._output_dir_resolved_str}
+            self._delimiter_line_res = {}
+            self._line_count_pos = 0
+            self._line_count = 0
+
+            with open(merged_file_path, "rb") as infile_b, \
+                    self._map_merged_file(infile_b, total_size) as merged_buf:
                 self.log("Checking for file hierarchy tree...")
-                first_line_bytes = b""
-                while True:
-                    b = infile_b.read(1)
-                    if not b or b == b'\n':
-                        break
-                    first_line_bytes += b
-                if b == b'\n':
-                    first_line_bytes += b
-
-                processed_size += len(first_line_bytes)
-                try:
-                    first_line_str = first_line_bytes.decode('utf-8').strip()
-                except UnicodeDecodeError:
-                    try:
-                        first_line_str = first_line_bytes.decode(
-                            'latin-1').strip()
-                    except Exception:
-                        first_line_str = None
+                # --- Parse over the mapped file: delimiters are located with C-level find() ---
+                buf_len = len(merged_buf)
+                state = SPLIT_STATE_SCANNING
+                current_file_path_relative = None
+                current_file_content = b""
+                pos = 0
+                last_progress_bytes = 0
+                # Encoded once per block; repeated paths (duplicate blocks) hit the cache.
+                # surrogateescape restores undecodable path bytes exactly as the START line had them
+                encode_end_delimiter = functools.lru_cache(maxsize=END_DELIMITER_CACHE_SIZE)(
+                    lambda path: get_end_delimiter_func(path).encode('utf-8', errors='surrogateescape'))
 
-                if first_line_str == TREE_START_DELIMITER:
+                # --- Skip Hierarchy Tree Section (if present) ---
+                first_line_end = merged_buf.find(b"\n")
+                first_line_end = buf_len if first_line_end < 0 else first_line_end + 1
+                if merged_buf[:first_line_end].rstrip() == TREE_START_DELIMITER_BYTES:
                     self.log(
                         f"Found '{TREE_START_DELIMITER}'. Skipping tree section...")
-                    tree_lines_skipped = 1
-                    skipped_successfully = False
-                    while self.is_running:
-                        line_bytes = b""
-                        while True:
-                            b = infile_b.read(1)
-                            if not b or b == b'\n':
-                                break
-                            line_bytes += b
-                        if b == b'\n':
-                            line_bytes += b
-
-                        if not line_bytes:
-                            self.log(
-                                f"Warning: Reached end of file while skipping tree. Expected '{TREE_END_DELIMITER}'.")
-                            break
-
-                        processed_size += len(line_bytes)
-                        tree_lines_skipped += 1
-                        try:
-                            line_str = line_bytes.decode('utf-8').strip()
-                        except UnicodeDecodeError:
-                            try:
-                                line_str = line_bytes.decode('latin-1').strip()
-                            except Exception:
-                                line_str = None
-
-                        if line_str == TREE_END_DELIMITER:
-                            self.log(
-                                f"Found '{TREE_END_DELIMITER}'. Skipped {tree_lines_skipped} lines of tree header.")
-                            skipped_successfully = True
-                            tree_skipped_bytes = processed_size
-                            if total_size > 0:
-                                self.signals.progress.emit(
-                                    min(int((processed_size / total_size) * 100), 100))
-                            break
-
-                    if not skipped_successfully and self.is_running:
+                    tree_end, pos = self._find_delimiter_line(
+                        merged_buf, TREE_END_DELIMITER_BYTES, first_line_end)
+                    if tree_end < 0:
+                        state = SPLIT_STATE_SKIPPING_TREE
+                        pos = buf_len
+                    else:
                         self.log(
-                            "Warning: Tree section might be incomplete or end delimiter not found. Proceeding with split after scanned lines.")
-                    elif not self.is_running:
-                        self.log("Split cancelled during tree skipping.")
-                        self.signals.finished.emit(False, "Split cancelled.")
-                        return
-                else:
-                    self.log("No hierarchy tree section found at the beginning.")
-                    infile_b.seek(0)
-                    processed_size = 0
-
-                if total_size > 0:
-                    self.signals.progress.emit(
-                        min(int((processed_size / total_size) * 100), 100))
-
-                # --- Main Splitting Logic ---
-                current_file_path_relative = None
-                current_file_content_lines = []
-                in_file_block = False
-                just_started_block = False
-                line_offset = 0
-
-                remaining_buffer = infile_b.read()
-                if not self.is_running:
+                            f"Found '{TREE_END_DELIMITER}'. Skipped {self._line_number_at(merged_buf, tree_end)} lines of tree header.")
+                elif buf_len:
                     self.log(
-                        "Split cancelled immediately after reading remaining file.")
-                    self.signals.finished.emit(False, "Split cancelled.")
-                    return
-
-                try:
-                    content_text = remaining_buffer.decode('utf-8')
-                except UnicodeDecodeError:
-                    self.log(
-                        "Warning: Decoding remaining content as UTF-8 failed. Trying latin-1.")
+                        "No hierarchy tree section found at the beginning.")
+
+                # --- Scan line by line for start delimiters, jump over block content ---
+                # Bound once; each block calls these
+                stop_requested = self._stop_event.is_set
+                find_delimiter_line = self._find_delimiter_line
+                submit_write = self._submit_write
+                flush_log = self._flush_log
+                pending_writes = self._pending_writes
+                while state == SPLIT_STATE_SCANNING and pos < buf_len:
+                    if stop_requested():
+                        break
+                    if pos - last_progress_bytes >= PROGRESS_BYTES_STEP:
+                        last_progress_bytes = pos
+                        # pos is a byte offset into the mapping, so this is pure integer math
+                        self._emit_progress(min(pos * 100 // total_size, 100))
+
+                    line_end = merged_buf.find(b"\n", pos)
+                    line_end = buf_len if line_end < 0 else line_end + 1
+                    # Delimiters always start at column 0; only trailing whitespace needs trimming
+                    line_stripped_b = merged_buf[pos:line_end].rstrip()
+                    line_start = pos
+                    pos = line_end
+                    if not line_stripped_b or not line_stripped_b.startswith(start_prefix_b):
+                        continue  # Separator and stray lines between blocks; no regex call needed
+
+                    start_match = start_regex.match(line_stripped_b)
+                    if not start_match:
+                        continue
                     try:
-                        content_text = remaining_buffer.decode('latin-1')
-                    except Exception as e_decode_rest:
-                        self.log(
-                            f"ERROR: Failed to decode remaining file content: {e_decode_rest}. Aborting split.")
-                        self.signals.error.emit(
-                            "Failed to decode file content for splitting.")
-                        self.signals.finished.emit(
-                            False, "Split failed: File decoding error.")
-                        return
-
-                lines = content_text.splitlines(keepends=True)
-                del content_text
-                del remaining_buffer
-
-                for line in lines:
-                    if not self.is_running:
+                        captured_path = start_match.group(1).decode(
+                            'utf-8', errors='surrogateescape').strip()
+                    except IndexError:
+                        self._queue_log(
+                            f"Warning: Regex '{start_regex_pattern}' matched approx line {self._line_number_at(merged_buf, line_start)} but captured no path group. Skipping block.")
+                        continue
+
+                    # The END line repeats the raw path bytes, so it is matched from captured_path;
+                    # file names and log messages replace undecodable bytes with U+FFFD as before
+                    potential_relative_path = captured_path
+                    if not captured_path.isascii():
+                        potential_relative_path = captured_path.encode(
+                            'utf-8', errors='surrogateescape').decode('utf-8', errors='replace')
+
+                    # --- Basic Path Safety Check ---
+                    # One regex scan catches absolute, drive-letter and '..' paths;
+                    # the full resolve() containment check still runs in _write_file
+                    if not potential_relative_path:
+                        self._queue_log(
+                            f"Warning: Empty filepath captured by start regex approx line {self._line_number_at(merged_buf, line_start)}. Skipping block.")
+                        continue
+                    if UNSAFE_PATH_RE.search(potential_relative_path):
+                        self._queue_log(
+                            f"Error: Security risk! Absolute path or path traversal found in delimiter: '{potential_relative_path}' approx line {self._line_number_at(merged_buf, line_start)}. Skipping block.")
+                        continue
+
+                    current_file_path_relative = potential_relative_path
+                    expected_end_b = encode_end_delimiter(captured_path)
+                    if skip_line_after_start and pos < buf_len:
+                        line_end = merged_buf.find(b"\n", pos)
+                        pos = buf_len if line_end < 0 else line_end + 1
+
+                    end_start, end_next = find_delimiter_line(
+                        merged_buf, expected_end_b, pos)
+                    if end_start < 0:
+                        # Unterminated block; saved with the rest of the file after the loop
+                        state = SPLIT_STATE_IN_BLOCK
+                        current_file_content = merged_buf[pos:]
+                        pos = buf_len
                         break
 
-                    line_offset += 1
-                    current_line_bytes_est = len(
-                        line.encode('utf-8', errors='ignore'))
-                    processed_size += current_line_bytes_est
-                    if total_size > 0:
-                        progress_percent = int(
-                            (processed_size / total_size) * 100)
-                        self.signals.progress.emit(min(progress_percent, 100))
-
-                    line_stripped = line.strip()
-
-                    # --- State Machine for Parsing ---
-                    if not in_file_block:
-                        start_match = start_regex.match(line_stripped)
-                        if start_match:
-                            try:
-                                potential_relative_path = start_match.group(
-                                    1).strip()
-                            except IndexError:
-                                self.log(
-                                    f"Warning: Regex '{start_regex_pattern}' matched approx line {line_offset} but captured no path group. Skipping block.")
-                                continue
-
-                            # --- Basic Path Safety Check ---
-                            normalized_path_check = potential_relative_path.replace(
-                                "\\", "/")
-                            is_safe = True
-                            if not potential_relative_path:
-                                self.log(
-                                    f"Warning: Empty filepath captured by start regex approx line {line_offset}. Skipping block.")
-                                is_safe = False
-                            elif pathlib.PurePath(potential_relative_path).is_absolute():
-                                self.log(
-                                    f"Error: Security risk! Absolute path found in delimiter: '{potential_relative_path}' approx line {line_offset}. Skipping block.")
-                                is_safe = False
-                            elif "../" in normalized_path_check or normalized_path_check.startswith("/"):
-                                self.log(
-                                    f"Warning: Potential path traversal or absolute-like path detected in delimiter: '{potential_relative_path}' near line {line_offset}. Final check during write.")
+                    # The pool writes straight from the mapping; only offsets are handed over
+                    flush_log()
+                    submit_write(
+                        current_file_path_relative, merged_buf, pos, end_start)
+                    pos = end_next
+                    if pending_writes and pending_writes[0][2].done():
+                        for written_path in self._reap_writes():
+                            file_count += 1
+                            created_file_paths.add(written_path)
+                    current_file_path_relative = None
 
-                            if not is_safe:
-                                continue
+                if self.is_running:
+                    self._flush_write_batch(merged_buf, parse_done=True)
 
-                            current_file_path_relative = potential_relative_path
-                            current_file_content_lines = []
-                            in_file_block = True
-                            just_started_block = skip_line_after_start
-                            continue
-                    else:
-                        if just_started_block:
-                            just_started_block = False
-                            continue
-
-                        expected_end_delimiter = get_end_delimiter_func(
-                            current_file_path_relative)
-                        if line_stripped == expected_end_delimiter:
-                            content_to_write = "".join(
-                                current_file_content_lines)
-                            if self._write_file(current_file_path_relative, content_to_write):
-                                file_count += 1
-                                created_file_paths.add(
-                                    self.output_dir.joinpath(current_file_path_relative))
-                            in_file_block = False
-                            current_file_path_relative = None
-                            current_file_content_lines = []
-                            just_started_block = False
-                            continue
-                        else:
-                            current_file_content_lines.append(line)
+            # Wait for queued writes so the counts and cleanup list are complete
+            for written_path in self._reap_writes(wait_all=True):
+                file_count += 1
+                created_file_paths.add(written_path)
 
+            self._flush_log()
             if not self.is_running:
                 self.log("Split cancelled during file processing.")
                 self.log(
                     f"Attempting cleanup of {len(created_file_paths)} created files...")
-                cleaned_count = 0
-                for f_path in created_file_paths:
-                    try:
-                        f_path_resolved = f_path.resolve()
-                        if f_path_resolved.is_file():
-                            f_path_resolved.unlink()
-                            cleaned_count += 1
-                    except OSError as e_unlink:
-                        self.log(
-                            f"Warning: Could not remove partially created file '{f_path}': {e_unlink}")
-                    except Exception as e_clean:
-                        self.log(
-                            f"Warning: Error during cleanup of '{f_path}': {e_clean}")
+                # Unlinks are independent; batches run on the write pool when one was started
+                cleanup_paths = list(created_file_paths)
+                cleanup_batches = [cleanup_paths[i:i + SPLIT_WRITE_BATCH_BLOCKS]
+                                   for i in range(0, len(cleanup_paths), SPLIT_WRITE_BATCH_BLOCKS)]
+                if self._write_pool is not None and len(cleanup_batches) > 1:
+                    cleaned_counts = self._write_pool.map(
+                        self._remove_created_files, cleanup_batches)
+                else:
+                    cleaned_counts = map(
+                        self._remove_created_files, cleanup_batches)
+                cleaned_count = sum(cleaned_counts)
+                self._flush_log()
                 self.log(f"Cleanup finished. Removed {cleaned_count} files.")
                 self.signals.finished.emit(False, "Split cancelled.")
                 return
 
-            if in_file_block and current_file_path_relative:
+            if state == SPLIT_STATE_SKIPPING_TREE:
+                self.log(
+                    f"Warning: Reached end of file while skipping tree. Expected '{TREE_END_DELIMITER}'.")
+            if state == SPLIT_STATE_IN_BLOCK and current_file_path_relative:
                 self.log(
                     f"Warning: Merged file ended before finding END delimiter for '{current_file_path_relative}'. Saving remaining content.")
-                content_to_write = "".join(current_file_content_lines)
-                if self._write_file(current_file_path_relative, content_to_write):
+                if self._write_file(current_file_path_relative, current_file_content):
                     file_count += 1
 
             # --- Post-processing ---
@@ -768,14 +1142,193 @@ class SplitterWorker(QObject):
             self.signals.error.emit(error_msg)
             self.signals.finished.emit(False, f"Split failed: {error_msg}")
         finally:
+            if self._write_pool is not None:
+                self._write_pool.shutdown(wait=True)
+                self._write_pool = None
+            if self._output_dir_fd is not None:
+                os.close(self._output_dir_fd)
+                self._output_dir_fd = None
             if self.is_running:
                 self.signals.progress.emit(100)
 
-    def _write_file(self, relative_path_str, content):
-        """Helper to write content to the appropriate file within the output directory.
-           Includes safety checks. Returns True on success, False on failure."""
+    @contextmanager
+    def _map_merged_file(self, infile_b, size):
+        """Maps the merged file read-only. Empty files cannot be mapped and yield b'' instead.
+           Queued block writes read straight from the mapping, so it is unmapped only after they finish."""
+        if size == 0:
+            yield b""
+            return
+        merged_buf = mmap.mmap(infile_b.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if hasattr(merged_buf, "madvise") and hasattr(mmap, "MADV_SEQUENTIAL"):
+                # The parse only moves forward; let the kernel read ahead aggressively
+                merged_buf.madvise(mmap.MADV_SEQUENTIAL)
+            yield merged_buf
+        finally:
+            wait_futures([future for _, _, future in self._pending_writes])
+            merged_buf.close()
+
+    def _line_number_at(self, buf, pos):
+        """Returns the 1-based line number of offset pos, counting on from the previous call.
+           Only needed for warnings, so block content is never scanned for newlines otherwise."""
+        if pos < self._line_count_pos:
+            self._line_count_pos = 0
+            self._line_count = 0
+        self._line_count += buf[self._line_count_pos:pos].count(b"\n")
+        self._line_count_pos = pos
+        return self._line_count + 1
+
+    def _literal_regex_prefix(self, pattern):
+        """Returns the literal text every match of an anchored pattern starts with, as UTF-8
+           bytes, or b'' when the pattern has no such head (no '^', or an alternation)."""
+        if not pattern.startswith("^") or "|" in pattern:
+            return b""
+        prefix = []
+        for char in pattern[1:]:
+            if char in REGEX_META_CHARS:
+                if char in REGEX_QUANTIFIER_CHARS and prefix:
+                    prefix.pop()
+                break
+            prefix.append(char)
+        return "".join(prefix).encode("utf-8")
+
+    def _find_delimiter_line(self, buf, delimiter_b, pos):
+        """Finds the first line at or after pos that equals delimiter_b apart from trailing whitespace.
+           Returns (line start, next line start), or (-1, -1) if there is no such line."""
+        buf_len = len(buf)
+        line_re = self._delimiter_line_res.get(delimiter_b)
+        while line_re is None:
+            # find() is cheapest while hits are real delimiters, and needs no compile per path
+            hit = buf.find(delimiter_b, pos)
+            if hit < 0:
+                return -1, -1
+            line_end = buf.find(b"\n", hit)
+            line_end = buf_len if line_end < 0 else line_end
+            if (hit == 0 or buf[hit - 1] == 0x0A) and \
+                    not buf[hit + len(delimiter_b):line_end].strip():
+                return hit, min(line_end + 1, buf_len)
+            # Mid-line occurrence (e.g. ``` inside content): let the regex engine skip these in C
+            line_re = re.compile(
+                b"(?m)^" + re.escape(delimiter_b) + b"[ \t\r\f\v]*$")
+            self._delimiter_line_res[delimiter_b] = line_re
+            pos = hit + 1
+        line_match = line_re.search(buf, pos)
+        if line_match is None:
+            return -1, -1
+        return line_match.start(), min(line_match.end() + 1, buf_len)
+
+    def _submit_write(self, relative_path_str, buf, start, end):
+        """Queues a write of buf[start:end]. Blocks are grouped so one pool task writes up to
+           SPLIT_WRITE_BATCH_BLOCKS of them, which keeps per-task overhead off small files."""
+        target_key = os.path.normcase(
+            relative_path_str.replace("\\", "/").strip("./ "))
+        # A later block for the same path must not race an earlier one; last write wins.
+        # Within one batch, blocks are written in order anyway
+        pending_future = self._pending_targets.get(target_key)
+        if pending_future is not None:
+            pending_future.result()
+        self._write_batch.append((relative_path_str, start, end))
+        self._write_batch_keys.append(target_key)
+        self._write_batch_bytes += end - start
+        if len(self._write_batch) >= SPLIT_WRITE_BATCH_BLOCKS or \
+                self._write_batch_bytes >= SPLIT_WRITE_BATCH_BYTES:
+            self._flush_write_batch(buf)
+
+    def _flush_write_batch(self, buf, parse_done=False):
+        """Submits the collected blocks as one pool task, bounding the number of pending tasks.
+           Once parsing is done, a lone block with nothing else pending is written directly."""
+        if not self._write_batch:
+            return
+        batch, batch_keys = self._write_batch, self._write_batch_keys
+        self._write_batch, self._write_batch_keys = [], []
+        self._write_batch_bytes = 0
+        if parse_done and len(batch) == 1 and not self._pending_writes:
+            # Single-file splits never start the pool; there is nothing to overlap with
+            future = Future()
+            try:
+                future.set_result(self._write_blocks(buf, batch))
+            except Exception as e_write:
+                future.set_exception(e_write)
+        else:
+            if self._write_pool is None:
+                self._write_pool = ThreadPoolExecutor(
+                    max_workers=SPLIT_WRITE_WORKERS, thread_name_prefix="split-write")
+            future = self._write_pool.submit(self._write_blocks, buf, batch)
+        for target_key in batch_keys:
+            self._pending_targets[target_key] = future
+        self._pending_writes.append((batch, batch_keys, future))
+        if len(self._pending_writes) > MAX_PENDING_WRITES:
+            # Parsing is ahead of the disk; wait for the oldest task to finish
+            self._pending_writes[0][2].result()
+
+    def _write_blocks(self, buf, batch):
+        """Writes each (relative path, start, end) block through a memoryview of buf, without
+           copying it out of the mapping. Returns one _write_file result per block.
+           An unexpected error in one block is logged with its traceback and counts as a failed
+           write (False), so the rest of the batch is still written and reported."""
+        results = []
+        with memoryview(buf) as whole:
+            for relative_path_str, start, end in batch:
+                try:
+                    with whole[start:end] as content:
+                        results.append(self._write_file(relative_path_str, content))
+                except Exception as e:
+                    self._queue_log(
+                        f"Error writing file for relative path '{relative_path_str}': {e}\n{traceback.format_exc()}")
+                    results.append(False)
+        return results
+
+    def _reap_writes(self, wait_all=False):
+        """Collects finished write tasks in submission order. Returns the absolute paths written successfully."""
+        written = []
+        while self._pending_writes:
+            batch, batch_keys, future = self._pending_writes[0]
+            if not wait_all and not future.done():
+                break
+            self._pending_writes.popleft()
+            for target_key in batch_keys:
+                if self._pending_targets.get(target_key) is future:
+                    del self._pending_targets[target_key]
+            try:
+                results = future.result()
+            except Exception as e:
+                trace = "".join(traceback.format_exception(
+                    type(e), e, e.__traceback__))
+                self.log(
+                    f"Error writing files for relative paths starting at '{batch[0][0]}': {e}\n{trace}")
+                continue
+            for written_path in results:
+                if written_path:
+                    written.append(written_path)
+        return written
+
+    def _remove_created_files(self, file_paths):
+        """Removes files this split created, after a cancel. Runs on the write pool for large sets.
+           Only regular files are unlinked: a path since replaced by a symlink is left alone
+           rather than followed. Returns the number of files removed."""
+        cleaned_count = 0
+        for f_path in file_paths:
+            try:
+                if stat.S_ISREG(os.lstat(f_path).st_mode):
+                    os.unlink(f_path)
+                    cleaned_count += 1
+            except FileNotFoundError:
+                pass  # Already gone; nothing to clean
+            except OSError as e_unlink:
+                self._queue_log(
+                    f"Warning: Could not remove partially created file '{f_path}': {e_unlink}")
+            except Exception as e_clean:
+                self._queue_log(
+                    f"Warning: Error during cleanup of '{f_path}': {e_clean}")
+        return cleaned_count
+
+    def _write_file(self, relative_path_str, content_bytes):
+        """Helper to write raw content bytes to the appropriate file within the output directory.
+           Includes safety checks. Returns the absolute path written on success, False on failure.
+           Per-file problems are queued with _queue_log, so a run with many bad blocks
+           sends them to the UI in batches rather than one signal each."""
         if not relative_path_str:
-            self.log(
+            self._queue_log(
                 "Error: Attempted to write file with empty relative path. Skipping.")
             return False
 
@@ -783,67 +1336,106 @@ class SplitterWorker(QObject):
         cleaned_relative_path = cleaned_relative_path.strip("./ ")
 
         if not cleaned_relative_path:
-            self.log(
+            self._queue_log(
                 f"Error: Relative path '{relative_path_str}' became empty after cleaning. Skipping.")
             return False
 
         target_path_resolved = None
         try:
-            target_path = self.output_dir.joinpath(cleaned_relative_path)
             # --- Final Safety Check ---
-            try:
-                if not self.output_dir.is_dir() or not os.access(str(self.output_dir), os.W_OK):
-                    raise FileNotFoundError(
-                        f"Output directory '{self.output_dir}' is not accessible or writable.")
-
-                output_dir_resolved = self.output_dir.resolve(strict=True)
-                target_path_resolved = target_path.resolve(strict=False)
-            except (OSError, ValueError) as e_resolve:
-                self.log(
-                    f"Error: Invalid path generated for '{cleaned_relative_path}': {e_resolve}. Skipping write.")
-                return False
-            except FileNotFoundError as e_fnf:
-                self.log(
-                    f"Error: {e_fnf}. Cannot write '{cleaned_relative_path}'.")
-                if self.is_running:
-                    self.signals.error.emit(f"Output directory issue: {e_fnf}")
-                    self.is_running = False
-                return False
-
-            is_within_output_dir = False
-            try:
-                is_within_output_dir = output_dir_resolved == target_path_resolved or \
-                    output_dir_resolved in target_path_resolved.parents
-            except Exception as path_comp_err:
-                self.log(
-                    f"Warning: Could not perform robust path comparison for '{target_path_resolved}': {path_comp_err}")
-                output_dir_str = str(output_dir_resolved).replace("\\", "/")
-                target_path_str = str(target_path_resolved).replace("\\", "/")
-                if target_path_str.startswith(output_dir_str + "/"):
-                    is_within_output_dir = True
-
-            if not is_within_output_dir:
-                self.log(f"Error: Security risk! Path '{cleaned_relative_path}' resolved to '{target_path_resolved}', "
-                         f"which is outside the designated output directory '{output_dir_resolved}'. Skipping write.")
-                return False
-
-            target_path_resolved.parent.mkdir(parents=True, exist_ok=True)
-            with open(target_path_resolved, "wb") as outfile:
+            # Sibling files share one checked parent; the file name is a single segment, as
+            # cleaning strips trailing dots and slashes, so joining it cannot leave that parent
+            relative_dir, _, file_name = cleaned_relative_path.rpartition("/")
+            parent_dir = self._parent_dirs.get(relative_dir)
+            if parent_dir is None:
+                # First file here: check lexically, then through any symlinks, and create it;
+                # resolving and makedirs both visit every ancestor, so this runs once per directory
+                parent_dir = os.path.normpath(os.path.join(
+                    self._output_dir_resolved_str, relative_dir))
+                target_path_resolved = os.path.join(parent_dir, file_name)
+                if not self._is_within_output_dir(parent_dir):
+                    return self._reject_outside_path(cleaned_relative_path, target_path_resolved)
+                parent_dir_real = os.path.realpath(parent_dir)
+                if not self._is_within_output_dir(parent_dir_real):
+                    return self._reject_outside_path(cleaned_relative_path, parent_dir_real)
+                os.makedirs(parent_dir, exist_ok=True)
+                with self._parent_dirs_lock:
+                    self._parent_dirs[relative_dir] = parent_dir
+            else:
+                target_path_resolved = os.path.join(parent_dir, file_name)
+            # The target itself is the only other place a symlink could redirect the write.
+            # O_NOFOLLOW makes the open refuse a link, so the common case needs no lstat
+            if OUTPUT_NOFOLLOW_FLAG:
                 try:
-                    outfile.write(content.encode('utf-8'))
-                except UnicodeEncodeError:
-                    self.log(
-                        f"Warning: Could not encode content for '{target_path_resolved}' as UTF-8. Using latin-1.")
-                    outfile.write(content.encode('latin-1', errors='replace'))
-            return True
+                    self._write_bytes(target_path_resolved, content_bytes,
+                                      OUTPUT_OPEN_FLAGS | OUTPUT_NOFOLLOW_FLAG)
+                    return target_path_resolved
+                except OSError as e_link:
+                    if e_link.errno not in SYMLINK_REFUSED_ERRNOS:
+                        raise
+            elif not os.path.islink(target_path_resolved):
+                self._write_bytes(target_path_resolved, content_bytes)
+                return target_path_resolved
+            target_real = os.path.realpath(target_path_resolved)
+            if not self._is_within_output_dir(target_real):
+                return self._reject_outside_path(cleaned_relative_path, target_real)
+            self._write_bytes(target_path_resolved, content_bytes)
+            return target_path_resolved
         except OSError as e:
-            log_path_str = str(
-                target_path_resolved) if target_path_resolved else f"(Failed resolving {cleaned_relative_path})"
-            self.log(f"Error writing file '{log_path_str}' (OS Error): {e}")
+            log_path_str = target_path_resolved or f"(Failed resolving {cleaned_relative_path})"
+            self._queue_log(f"Error writing file '{log_path_str}' (OS Error): {e}")
+            # Output directory was validated at start; re-check only on failure
+            if self.is_running and (not self.output_dir.is_dir() or not os.access(str(self.output_dir), os.W_OK)):
+                self._flush_log()
+                self.signals.error.emit(
+                    f"Output directory issue: '{self.output_dir}' is not accessible or writable.")
+                self.stop()
             return False
-        except Exception as e:
-            log_path_str = str(
-                target_path_resolved) if target_path_resolved else f"(Failed resolving {cleaned_relative_path})"
-            self.log(
-                f"Error writing file for relative path '{cleaned_relative_path}' (Resolved: {log_path_str}) (General Error): {e}\n{traceback.format_exc()}")
+        except ValueError as e:
+            # e.g. a NUL byte in the path; recoverable per file, so no traceback is formatted.
+            # Anything else is a bug and reaches _reap_writes with its traceback
+            log_path_str = target_path_resolved or f"(Failed resolving {cleaned_relative_path})"
+            self._queue_log(
+                f"Error writing file for relative path '{cleaned_relative_path}' (Resolved: {log_path_str}) (General Error): {e}")
             return False
+
+    def _is_within_output_dir(self, path_str):
+        """Tests an absolute, normalized path against the resolved output directory.
+           A trailing separator lets one prefix test also accept the directory itself."""
+        # Paths built from the output directory pass the first test without normcase
+        return path_str.startswith(self._output_dir_prefix) or \
+            (os.path.normcase(path_str) + os.sep).startswith(self._output_dir_prefix_norm)
+
+    def _reject_outside_path(self, cleaned_relative_path, resolved_path):
+        """Logs a write refused because it would land outside the output directory. Returns False."""
+        self._queue_log(
+            f"Error: Security risk! Path '{cleaned_relative_path}' resolved to '{resolved_path}', "
+            f"which is outside the designated output directory '{self._output_dir_resolved_str}'. Skipping write.")
+        return False
+
+    def _write_bytes(self, target_path, data, open_flags=OUTPUT_OPEN_FLAGS):
+        """Writes data to the target_path string through a raw file descriptor, bypassing Python buffering."""
+        if self._output_dir_fd is not None and target_path.startswith(self._output_dir_prefix):
+            fd = os.open(target_path[len(self._output_dir_prefix):], open_flags, 0o644,
+                         dir_fd=self._output_dir_fd)
+        else:
+            fd = os.open(target_path, open_flags, 0o644)
+        try:
+            view = memoryview(data)
+            total = len(view)
+            if total >= FALLOCATE_MIN_BYTES and hasattr(os, "posix_fallocate"):
+                try:
+                    # One extent reservation instead of growing the file write by write;
+                    # see FALLOCATE_MIN_BYTES for the cost where the filesystem lacks fallocate
+                    os.posix_fallocate(fd, 0, total)
+                except OSError:
+                    pass  # Unsupported by the filesystem; the write allocates as usual
+            # Regular files take the whole buffer in one write; only a short write slices
+            written = os.write(fd, view) if total else 0
+            while written < total:
+                written += os.write(fd, view[written:])
+            # Large split outputs are unlikely to be read back soon
+            if total >= FADVISE_MIN_BYTES and hasattr(os, "posix_fadvise"):
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)